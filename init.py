@@ -3,8 +3,10 @@ import string
 import psycopg2
 import logging
 import os
+import sys
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from faker import Faker
 
@@ -15,6 +17,25 @@ fake = Faker()
 
 
 
+class TokenBucket():
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def acquire(self, n: int):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # batches bigger than the bucket go into debt instead of waiting forever
+            if self.tokens >= min(n, self.capacity):
+                self.tokens -= n
+                return
+            time.sleep((min(n, self.capacity) - self.tokens) / self.rate)
+
+
 class Generator():
     def __init__(
         self,
@@ -24,20 +45,36 @@ class Generator():
         connect_retires: int,
         connect_interval: int,
         crypt_key: string,
-        random_seed: int
+        random_seed: int,
+        node_index: int = 0,
+        node_count: int = 1,
+        node_wait_timeout: int = 3600
     ):
-        random.seed(random_seed)
+        if node_count < 1 or not 0 <= node_index < node_count:
+            raise ValueError(f"Invalid node index {node_index} for {node_count} nodes")
+
+        self.node_index = node_index
+        self.node_count = node_count
+        self.node_wait_timeout = node_wait_timeout
+        self.poll_interval = connect_interval
+        # every node gets its own deterministic stream, node 0 of 1 keeps the plain seed
+        shard_seed = random_seed * node_count + node_index
+        random.seed(shard_seed)
         self.batch_size = 100000
-        Faker.seed(random_seed)
+        Faker.seed(shard_seed)
         self.db_name = dbname + '.'
+        # kept to open extra connections, application_name lets nodes see each other,
+        # the first node is renamed once it has cleaned and seeded the parent tables
+        self.connection_params = dict(dbname=dbname,
+                                      user=user,
+                                      password=password,
+                                      host=host,
+                                      port=port,
+                                      application_name=f"db-init-{node_index}-seeding" if node_index == 0 else f"db-init-{node_index}")
         is_connected = False
         for i in range(connect_retires):
             try:
-                self.connection = psycopg2.connect(dbname=dbname,
-                                             user=user,
-                                             password=password,
-                                             host=host,
-                                             port=port)
+                self.connection = psycopg2.connect(**self.connection_params)
                 is_connected = True
                 logger.info("Successfully connected to DB!")
                 break
@@ -60,6 +97,7 @@ class Generator():
             "roles",
             "permissions",
             "users_achievements",
+            "achievements",
             "friendships",
             "event_users",
             "place_beer_assortment",
@@ -71,6 +109,18 @@ class Generator():
             "events",
             "places"
         ]
+        self.insert_queries = {
+            "users": "INSERT INTO untappd_db.users (user_id, username, email, password_hash, is_active, created_at) VALUES (%s, %s, %s, %s, %s, %s)",
+            "user_profiles": "INSERT INTO untappd_db.user_profiles (user_id, user_image_url, first_name, last_name, sex, date_of_birth, profile_desc) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            "friendships": "INSERT INTO untappd_db.friendships (user1_id, user2_id, status) VALUES (%s, %s, %s)",
+            "event_users": "INSERT INTO untappd_db.event_users (event_id, user_id, status) VALUES (%s, %s, %s)",
+            "reviews": "INSERT INTO untappd_db.reviews (user_id, beer_id, rating, serving, place_id, comment, photo_url, event_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        }
+        # big fact tables worth storing in the order they are usually read
+        self.cluster_keys = {
+            "reviews": "beer_id",
+            "friendships": "user1_id",
+        }
     
 
     def close_connection(self):
@@ -100,65 +150,557 @@ class Generator():
 
         return result
 
+    def is_range_empty(self, table_name, column, first_id, last_id):
+        try:
+            self.cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {table_name} WHERE {column} BETWEEN %s AND %s)",
+                (first_id, last_id)
+            )
+            result = not self.cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error checking if range of table '{table_name}' is empty: {str(e)}")
+            result = False
+
+        return result
+
     def init_data(self, n: int):
-        logger.info("Starting full generation!")
-        self._generate_users(n) # users
-        self._generate_user_profiles() # user_profiles for users
-        self._generate_roles() # roles
-        self._generate_user_roles()
-        self._generate_permissions()
-        self._generate_role_permissions()
-        self._generate_achievements(int(n**0.5))
-        self._generate_user_achievements(int(n**0.5)) # same as achievements num
-        self._generate_user_friendships() 
-        self._generate_beer_styles()
-        self._generate_breweries(int(n**0.5))
-        self._generate_beer(n)
-        self._generate_places(int(n**0.5))
-        self._generate_events(5 * int(n**0.5))
+        logger.info(f"Starting full generation on node {self.node_index + 1} of {self.node_count}!")
+        parents_num = int(n**0.5)
+
+        # small parent tables are generated once, by the first node
+        if self.node_index == 0:
+            self._generate_roles()
+            self._generate_permissions()
+            self._generate_role_permissions()
+            self._generate_achievements(parents_num)
+            self._generate_beer_styles()
+            self._generate_breweries(parents_num)
+            self._generate_places(parents_num)
+            self._generate_events(5 * parents_num)
+            # a failed generator leaves the transaction aborted and the next ones skipped
+            self.connection.rollback()
+            if self._count_rows('events') < 5 * parents_num:
+                self._fail("Parent tables were not generated")
+            self.cursor.execute("SET application_name = 'db-init-0'")
+            self.connection.commit()
+        self._wait_for_parents(5 * parents_num)
+
+        # every node generates its own slice of users, beer and everything hanging on them
+        first_user_id, last_user_id = self._shard_range(n)
+        self._generate_users(first_user_id, last_user_id) # users
+        self._generate_user_profiles(first_user_id, last_user_id) # user_profiles for users
+        self._generate_user_roles(first_user_id, last_user_id)
+        self._generate_user_achievements(first_user_id, last_user_id)
+        self._generate_beer(*self._shard_range(n))
+        self.connection.rollback()
+        if not self._is_shard_loaded('users', 'user_id', n) or not self._is_shard_loaded('beer', 'beer_id', n):
+            self._fail(f"Shard of node {self.node_index} was not generated")
+
+        # the rest references users and beer of the other nodes as well
+        self._wait_for_shards('users', 'user_id', n)
+        self._wait_for_shards('beer', 'beer_id', n)
+        if self.node_index == 0:
+            self._fix_sequences()
+        self._generate_user_friendships(first_user_id, last_user_id)
         self._generate_event_users()
-        self._generate_place_beer_assortment(int(n**0.5))
-        self._generate_reviews()
+        self._generate_place_beer_assortment()
+        self._generate_reviews(first_user_id, last_user_id)
 
+        logger.info("Generation ended successfully!")
 
+    def optimize_data(self, workers: int, cluster: bool):
+        logger.info("Starting post-load optimization!")
+        if self.node_count > 1:
+            self._wait_for_nodes()
+
+        timings = {}
+        failures = {}
+        if cluster:
+            timings['cluster'], failures['cluster'] = self._run_concurrently('cluster', workers, [
+                # the index is only needed for ordering, one transaction keeps the schema as migrated
+                (table, [
+                    f"BEGIN; "
+                    f"CREATE INDEX {table}_{column}_cluster_idx ON {self.db_name + table} ({column}); "
+                    f"CLUSTER {self.db_name + table} USING {table}_{column}_cluster_idx; "
+                    f"DROP INDEX {self.db_name + table}_{column}_cluster_idx; "
+                    f"COMMIT"
+                ])
+                for table, column in self.cluster_keys.items()
+            ])
+        timings['vacuum freeze'], failures['vacuum freeze'] = self._run_concurrently('vacuum freeze', workers, [
+            (table, [f"VACUUM (FREEZE) {self.db_name + table}"]) for table in self.table_names
+        ])
+        timings['analyze'], failures['analyze'] = self._run_concurrently('analyze', workers, [
+            (table, [f"ANALYZE {self.db_name + table}"]) for table in self.table_names
+        ])
 
-        logger.info("Generation ended successfully!")
+        try:
+            self.cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_prewarm")
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            logger.error(f"Error creating extension 'pg_prewarm': {str(e)}")
+        self.cursor.execute("SELECT i.indexname FROM pg_indexes AS i WHERE i.schemaname = %s", (self.db_name[:-1],))
+        indexes = list(map(lambda x: x[0], self.cursor.fetchall()))
+        self.connection.commit()
+        timings['prewarm'], failures['prewarm'] = self._run_concurrently('prewarm', workers, [
+            (relation, [f"SELECT pg_prewarm('{self.db_name + relation}')"]) for relation in self.table_names + indexes
+        ])
+
+        for step, elapsed in timings.items():
+            if failures[step]:
+                logger.error(f"Step '{step}' took {elapsed:.2f}s, failed for {', '.join(failures[step])}")
+            else:
+                logger.info(f"Step '{step}' took {elapsed:.2f}s")
+        failed_num = sum(len(failed) for failed in failures.values())
+        logger.info(f"Optimization ended in {sum(timings.values()):.2f}s with {failed_num} failed relations!")
+        return timings, failures
+
+    def trickle_data(self, n: int, rows_per_sec: int, duration: int, batch_size: int):
+        logger.info(f"Starting trickle ingestion of {rows_per_sec} rows/sec!")
+        self.cursor.execute(f"SET application_name = 'db-init-{self.node_index}-trickle'")
+        self.connection.commit()
+
+        # new users take ids from the sequence, the first node moves it past the loaded ones
+        def is_ready():
+            self.cursor.execute(
+                "SELECT COALESCE(pg_sequence_last_value(pg_get_serial_sequence(%s, 'user_id')::regclass), 0)",
+                (self.db_name + 'users',)
+            )
+            last_value = self.cursor.fetchone()[0]
+            self.connection.commit()
+            return last_value >= n
+
+        self._wait_for("the users sequence to be fixed", is_ready)
+
+        # other nodes' new users may be uncommitted and failed batches leave gaps in the
+        # sequence, so only bulk loaded users and this node's committed ones are referenced
+        new_user_ids = []
+
+        def random_user_id():
+            k = random.randint(1, n + len(new_user_ids))
+            return k if k <= n else new_user_ids[k - n - 1]
+
+        self.cursor.execute(f"SELECT MIN(b.beer_id), MAX(b.beer_id) FROM untappd_db.beer AS b")
+        min_beer_id, max_beer_id = self.cursor.fetchone()
+
+        self.cursor.execute(f"SELECT p.place_id FROM untappd_db.places AS p")
+        places = list(map(lambda x: x[0], self.cursor.fetchall()))
+
+        self.cursor.execute(f"SELECT e.event_id FROM untappd_db.events AS e")
+        events = list(map(lambda x: x[0], self.cursor.fetchall()))
+        self.connection.commit()
+
+        bucket = TokenBucket(rows_per_sec, max(rows_per_sec, batch_size))
+        tables = ['users', 'reviews', 'friendships', 'event_users']
+        weights = [1, 12, 4, 3]
+        inserted = dict.fromkeys(tables + ['user_profiles'], 0)
+        started = reported = time.time()
+
+        while not duration or time.time() - started < duration:
+            # a friendship needs two different users
+            weights[2] = 4 if n + len(new_user_ids) > 1 else 0
+            table = random.choices(tables, weights)[0]
+            # mostly small batches with a long tail, like a real application
+            batch = max(1, min(int(random.expovariate(1 / batch_size)), 10 * batch_size))
+            # every new user comes with a profile
+            bucket.acquire(2 * batch if table == 'users' else batch)
+
+            try:
+                if table == 'users':
+                    self.cursor.execute(
+                        "SELECT nextval(pg_get_serial_sequence(%s, 'user_id')) FROM generate_series(1, %s)",
+                        (self.db_name + 'users', batch)
+                    )
+                    ids = list(map(lambda x: x[0], self.cursor.fetchall()))
+                    self.cursor.executemany(self.insert_queries['users'], [self._user_row(id) for id in ids])
+                    self.cursor.executemany(self.insert_queries['user_profiles'], [self._user_profile_row(id) for id in ids])
+                elif table == 'reviews':
+                    self.cursor.executemany(self.insert_queries['reviews'], [
+                        self._review_row(random_user_id(), random.randint(min_beer_id, max_beer_id), places, events)
+                        for k in range(batch)
+                    ])
+                elif table == 'friendships':
+                    friendships = []
+                    while len(friendships) < batch:
+                        user1_id, user2_id = sorted((random_user_id(), random_user_id()))
+                        if user1_id != user2_id:
+                            friendships.append(self._friendship_row(user1_id, user2_id))
+                    self.cursor.executemany(self.insert_queries['friendships'], friendships)
+                else:
+                    self.cursor.executemany(self.insert_queries['event_users'], [
+                        self._event_user_row(random.choice(events), random_user_id())
+                        for k in range(batch)
+                    ])
+                self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                logger.error(f"Error inserting into table '{self.db_name + table}': {str(e)}")
+                continue
+
+            if table == 'users':
+                new_user_ids.extend(ids)
+                inserted['user_profiles'] += batch
+            inserted[table] += batch
+
+            if time.time() - reported >= 60:
+                total = sum(inserted.values())
+                logger.info(f"Trickled {total} rows ({total / (time.time() - started):.1f} rows/sec): {inserted}")
+                reported = time.time()
+
+        logger.info(f"Trickle ingestion ended, inserted {inserted}")
+
+    def validate_data(self, n: int, sample_percent: float):
+        logger.info(f"Starting validation with {sample_percent}% samples!")
+        started = time.time()
+        failures = []
+
+        def check(name, ok, value):
+            if ok:
+                logger.info(f"OK {name}: {value}")
+            else:
+                logger.error(f"FAILED {name}: {value}")
+                failures.append(name)
+
+        # row counts, exact for the whole dataset
+        tables = self.table_names
+        self.cursor.execute("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {self.db_name + table})" for table in tables))
+        counts = dict(zip(tables, self.cursor.fetchone()))
+        parents_num = int(n**0.5)
+        for table, expected in [
+            ('roles', 4), ('permissions', 8), ('beer_styles', 20), ('beer', n),
+            ('achievements', parents_num), ('brewery', parents_num),
+            ('places', parents_num), ('events', 5 * parents_num),
+        ]:
+            check(f"count of '{table}'", counts[table] == expected, f"{counts[table]}, expected {expected}")
+        # trickle ingestion adds users with profiles, but no roles or achievements
+        check("count of 'users'", counts['users'] >= n, f"{counts['users']}, expected at least {n}")
+        check("count of 'user_profiles'", counts['user_profiles'] == counts['users'], f"{counts['user_profiles']}, expected {counts['users']}")
+
+        # so roles and achievements are compared for the bulk loaded users only
+        self.cursor.execute(
+            f"SELECT (SELECT COUNT(*) FROM {self.db_name}user_roles AS ur WHERE ur.user_id <= %s), "
+            f"(SELECT COUNT(*) FROM {self.db_name}users_achievements AS ua WHERE ua.user_id <= %s)",
+            (n, n)
+        )
+        loaded_user_roles, loaded_users_achievements = self.cursor.fetchone()
+        # while reviews, friendships and event visitors keep growing for old users and events too
+        is_trickled = counts['users'] > n
+        for table, count, parent, parent_count, low, high in [
+            ('user_roles', loaded_user_roles, 'users', n, 1.0, 1.1),
+            ('roles_permissions', counts['roles_permissions'], 'roles', counts['roles'], 2.0, 5.0),
+            ('users_achievements', loaded_users_achievements, 'users', n, 2.0, 3.0),
+            ('friendships', counts['friendships'], 'users', n, 7.0, float('inf') if is_trickled else 12.0),
+            ('reviews', counts['reviews'], 'users', n, 4.0, float('inf') if is_trickled else 6.0),
+            ('event_users', counts['event_users'], 'events', counts['events'], 40.0, float('inf') if is_trickled else 60.0),
+            ('place_beer_assortment', counts['place_beer_assortment'], 'places', counts['places'], 400.0, 600.0),
+        ]:
+            ratio = count / parent_count if parent_count else 0
+            check(f"'{table}' per '{parent}'", low <= ratio <= high, f"{ratio:.2f}, expected {low}..{high}")
+
+        # foreign keys, on a sample of the child table
+        for table, column, parent, parent_column in [
+            ('user_profiles', 'user_id', 'users', 'user_id'),
+            ('user_roles', 'user_id', 'users', 'user_id'),
+            ('user_roles', 'role_id', 'roles', 'role_id'),
+            ('roles_permissions', 'role_id', 'roles', 'role_id'),
+            ('roles_permissions', 'permission_id', 'permissions', 'permission_id'),
+            ('users_achievements', 'user_id', 'users', 'user_id'),
+            ('users_achievements', 'achievement_id', 'achievements', 'achievement_id'),
+            ('friendships', 'user1_id', 'users', 'user_id'),
+            ('friendships', 'user2_id', 'users', 'user_id'),
+            ('beer', 'brewery_id', 'brewery', 'brewery_id'),
+            ('beer', 'style_id', 'beer_styles', 'style_id'),
+            ('events', 'place_id', 'places', 'place_id'),
+            ('event_users', 'event_id', 'events', 'event_id'),
+            ('event_users', 'user_id', 'users', 'user_id'),
+            ('place_beer_assortment', 'place_id', 'places', 'place_id'),
+            ('place_beer_assortment', 'beer_id', 'beer', 'beer_id'),
+            ('reviews', 'user_id', 'users', 'user_id'),
+            ('reviews', 'beer_id', 'beer', 'beer_id'),
+            ('reviews', 'place_id', 'places', 'place_id'),
+            ('reviews', 'event_id', 'events', 'event_id'),
+        ]:
+            self.cursor.execute(
+                f"SELECT COUNT(*) FROM {self.db_name + table} AS c TABLESAMPLE SYSTEM (%s) "
+                f"WHERE c.{column} IS NOT NULL AND NOT EXISTS "
+                f"(SELECT 1 FROM {self.db_name + parent} AS p WHERE p.{parent_column} = c.{column})",
+                (sample_percent,)
+            )
+            orphans = self.cursor.fetchone()[0]
+            check(f"'{table}.{column}' references '{parent}'", orphans == 0, f"{orphans} orphans in sample")
+
+        # value distributions, on a sample
+        self.cursor.execute(
+            f"SELECT COUNT(*), MIN(r.rating), MAX(r.rating), AVG(r.rating) "
+            f"FROM {self.db_name}reviews AS r TABLESAMPLE SYSTEM (%s)",
+            (sample_percent,)
+        )
+        sampled, min_rating, max_rating, avg_rating = self.cursor.fetchone()
+        if sampled:
+            check("'reviews.rating' range", 0.0 <= min_rating and max_rating <= 5.0, f"{min_rating}..{max_rating}")
+            check("'reviews.rating' mean", 2.3 <= avg_rating <= 2.7, f"{avg_rating:.2f}, expected 2.3..2.7")
+
+        for table, column, expected in [
+            ('users', 'is_active', {True: 10 / 11, False: 1 / 11}),
+            ('user_profiles', 'sex', {'male': 3 / 7, 'female': 3 / 7, 'not_applicable': 1 / 7}),
+            ('friendships', 'status', {'active': 8 / 9, 'canceled': 1 / 9}),
+            ('event_users', 'status', {'dislike': 1 / 3, 'like': 1 / 3, 'willbe': 1 / 3}),
+            ('place_beer_assortment', 'serving', {'bottle': 1 / 3, 'tap': 1 / 3, 'can': 1 / 3}),
+            ('reviews', 'serving', {'bottle': 1 / 3, 'tap': 1 / 3, 'can': 1 / 3}),
+        ]:
+            self.cursor.execute(
+                f"SELECT t.{column}, COUNT(*) FROM {self.db_name + table} AS t TABLESAMPLE SYSTEM (%s) GROUP BY t.{column}",
+                (sample_percent,)
+            )
+            values = dict(self.cursor.fetchall())
+            sampled = sum(values.values())
+            if not sampled:
+                logger.warning(f"Sample of '{table}' is empty, skip distribution of '{column}'")
+                continue
+            shares = {value: count / sampled for value, count in values.items()}
+            ok = set(shares) <= set(expected) and all(abs(shares.get(value, 0) - share) <= 0.05 for value, share in expected.items())
+            check(f"'{table}.{column}' distribution", ok, ", ".join(f"{value}: {share:.3f}" for value, share in shares.items()))
+
+        # duplicates come from trickle ingestion in separate batches, so rows are not sampled,
+        # all friendships of the users found in a sample are checked instead
+        self.cursor.execute(
+            f"WITH s AS (SELECT DISTINCT f.user1_id FROM {self.db_name}friendships AS f TABLESAMPLE SYSTEM (%s)) "
+            f"SELECT COUNT(*) FILTER (WHERE d.user1_id >= d.user2_id), COUNT(*) FILTER (WHERE d.pairs > 1) "
+            f"FROM (SELECT f.user1_id, f.user2_id, COUNT(*) AS pairs "
+            f"FROM {self.db_name}friendships AS f JOIN s USING (user1_id) GROUP BY f.user1_id, f.user2_id) AS d",
+            (sample_percent,)
+        )
+        unordered, duplicates = self.cursor.fetchone()
+        check("'friendships' ordered pairs", unordered == 0, f"{unordered} pairs with user1_id >= user2_id of sampled users")
+        check("'friendships' duplicates", duplicates == 0, f"{duplicates} duplicated pairs of sampled users")
+        self.connection.commit()
+
+        logger.info(f"Validation ended in {time.time() - started:.2f}s with {len(failures)} failed checks")
+        return failures
+
+    def _run_concurrently(self, step: str, workers: int, tasks: list):
+        logger.info(f"Start {step} of {len(tasks)} relations in {workers} connections")
+
+        def run(table, statements):
+            started = time.time()
+            connection = None
+            try:
+                connection = psycopg2.connect(**self.connection_params)
+                # VACUUM can not run inside a transaction block
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+            except Exception as e:
+                logger.error(f"Error during {step} of relation '{table}': {str(e)}")
+                return False
+            finally:
+                if connection is not None:
+                    connection.close()
+            logger.info(f"Finish {step} of relation '{table}' in {time.time() - started:.2f}s")
+            return True
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(table, executor.submit(run, table, statements)) for table, statements in tasks]
+            failed = [table for table, future in futures if not future.result()]
+
+        return time.time() - started, failed
+
+    def _wait_for_nodes(self):
+        # every node passed the shard barrier, so a finished one has closed its connection
+        # or renamed it for trickle ingestion
+        def is_ready():
+            self.cursor.execute(
+                "SELECT COUNT(*) FROM pg_stat_activity WHERE application_name ~ '^db-init-[0-9]+$' AND pid <> pg_backend_pid()"
+            )
+            count = self.cursor.fetchone()[0]
+            self.connection.commit()
+            return count == 0
+
+        self._wait_for("the other nodes to finish", is_ready)
+
+    def _shard_range(self, n: int, node_index: int = None):
+        if node_index is None:
+            node_index = self.node_index
+        first_id = n * node_index // self.node_count + 1
+        last_id = n * (node_index + 1) // self.node_count
+        return first_id, last_id
+
+    def _shard_slice(self, ids: list):
+        first, last = self._shard_range(len(ids))
+        return ids[first - 1:last]
+
+    def _count_rows(self, table: str):
+        self.cursor.execute(f"SELECT COUNT(*) FROM {self.db_name + table}")
+        count = self.cursor.fetchone()[0]
+        self.connection.commit()
+        return count
+
+    def _is_shard_loaded(self, table: str, column: str, n: int):
+        first_id, last_id = self._shard_range(n)
+        if first_id > last_id:
+            return True
+        self.cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {self.db_name + table} WHERE {column} = %s)", (last_id,))
+        result = self.cursor.fetchone()[0]
+        self.connection.commit()
+        return result
+
+    def _fail(self, reason: str):
+        logger.error(reason)
+        self.connection.rollback()
+        self.cursor.execute(f"SET application_name = 'db-init-{self.node_index}-failed'")
+        self.connection.commit()
+        # keep the session for a couple of polls, so waiting nodes notice it and stop too
+        time.sleep(2 * self.poll_interval)
+        raise RuntimeError(reason)
+
+    def _wait_for(self, description, is_ready):
+        deadline = time.time() + self.node_wait_timeout
+        while True:
+            try:
+                self.cursor.execute(
+                    "SELECT string_agg(application_name, ', ') FROM pg_stat_activity WHERE application_name ~ '^db-init-[0-9]+-failed$'"
+                )
+                failed = self.cursor.fetchone()[0]
+                self.connection.commit()
+                if failed:
+                    raise RuntimeError(f"Stopped waiting for {description}, failed nodes: {failed}")
+                if is_ready():
+                    return
+            except RuntimeError:
+                raise
+            except Exception as e:
+                self.connection.rollback()
+                logger.error(f"Error waiting for {description}: {str(e)}")
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for {description}")
+            logger.info(f"Node {self.node_index} is waiting for {description}")
+            time.sleep(self.poll_interval)
+
+    def _wait_for_parents(self, events_num: int):
+        # stale parent tables of a previous run may be truncated yet, so also wait
+        # for the first node to be renamed after cleaning and seeding them
+        def is_ready():
+            self.cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM pg_stat_activity WHERE application_name = 'db-init-0'), "
+                f"(SELECT COUNT(*) FROM {self.db_name}events)"
+            )
+            is_seeded, count = self.cursor.fetchone()
+            self.connection.commit()
+            return is_seeded and count >= events_num
+
+        self._wait_for("parent tables seeded by the first node", is_ready)
+
+    def _wait_for_shards(self, table: str, column: str, n: int):
+        table_name = self.db_name + table
+        # rows are committed in id order, so a shard is loaded once its last id is visible
+        last_ids = []
+        for node_index in range(self.node_count):
+            first_id, last_id = self._shard_range(n, node_index)
+            if first_id <= last_id:
+                last_ids.append(last_id)
+
+        def is_ready():
+            self.cursor.execute(
+                f"SELECT COUNT(*) FROM {table_name} WHERE {column} = ANY(%s)",
+                (last_ids,)
+            )
+            count = self.cursor.fetchone()[0]
+            self.connection.commit()
+            return count == len(last_ids)
 
+        self._wait_for(f"all shards of '{table_name}'", is_ready)
 
-    def _generate_users(self, n: int):
+    def _fix_sequences(self):
+        # users and beer are inserted with explicit ids, move their sequences past them
+        for table, column in [('users', 'user_id'), ('beer', 'beer_id')]:
+            table_name = self.db_name + table
+            try:
+                self.cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, %s), MAX({column})) FROM {table_name}",
+                    (table_name, column)
+                )
+                self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                logger.error(f"Error fixing sequence of table '{table_name}': {str(e)}")
+                continue
+            logger.info(f"Fixed sequence of table '{table_name}'")
+
+
+    def _user_row(self, user_id: int):
+        username = fake.user_name()
+        email = fake.email()
+        password_hash = fake.sha1()
+        is_active = random.choice([*[True for k in range(10)], False])
+        created_at = fake.date_time_this_decade()
+        return (user_id, username, email, password_hash, is_active, created_at)
+
+    def _user_profile_row(self, user_id: int):
+        user_image_url = fake.image_url()
+        sex = random.choice(['male', 'male', 'male', 'female', 'female', 'female', 'not_applicable'])
+        first_name = fake.first_name_male() if sex == 'male' else fake.first_name_female()
+        last_name = fake.last_name_male() if sex == 'male' else fake.last_name_female()
+        date_of_birth = fake.date_of_birth(minimum_age=18, maximum_age=80)
+        profile_desc = fake.text(max_nb_chars=512)
+        return (user_id, user_image_url, first_name, last_name, sex, date_of_birth, profile_desc)
+
+    def _friendship_row(self, user1_id: int, user2_id: int):
+        status = random.choice(['active' for k in range(8)] + ['canceled'])
+        return (user1_id, user2_id, status)
+
+    def _event_user_row(self, event_id: int, user_id: int):
+        status = random.choice(['dislike', 'like', 'willbe'])
+        return (event_id, user_id, status)
+
+    def _review_row(self, user_id: int, beer_id: int, places: list, events: list):
+        rating = round(random.uniform(0.0, 5.0), 1)
+        serving = random.choice(['bottle', 'tap', 'can', None])
+        place_id = random.choice(places)
+        comment = fake.sentence(nb_words=15, variable_nb_words=True, ext_word_list=None)
+        photo_url = fake.image_url()
+        event_id = None
+        if random.randint(0,1):
+            event_id = random.choice(events)
+        serving = random.choice(['bottle', 'tap', 'can'])
+        return (user_id, beer_id, rating, serving, place_id, comment, photo_url, event_id)
+
+    def _generate_users(self, first_id: int, last_id: int):
         table = self.db_name + 'users'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user_id', first_id, last_id):
+            logger.info(f"Users {first_id}..{last_id} of table '{table}' already exist, skip")
             return
 
+        n = last_id - first_id + 1
         logger.info(f"Start generation of {n} users")
 
         users = []
-        for _ in range(n):
-            username = fake.user_name()
-            email = fake.email()
-            password_hash = fake.sha1()
-            is_active = random.choice([*[True for k in range(10)], False])
-            created_at = fake.date_time_this_decade()
-            users.append((username, email, password_hash, is_active, created_at))
+        for user_id in range(first_id, last_id + 1):
+            users.append(self._user_row(user_id))
 
-        try:
-            query = "INSERT INTO untappd_db.users (username, email, password_hash, is_active, created_at) VALUES (%s, %s, %s, %s, %s)"
-            self.cursor.executemany(query, users)
-            self.connection.commit()
-        except Exception as e:
-            logger.error(f"Error inserting into table '{table}': {str(e)}")
-            return
+            if len(users) > self.batch_size or user_id == last_id:
+                try:
+                    self.cursor.executemany(self.insert_queries['users'], users)
+                    self.connection.commit()
+                except Exception as e:
+                    logger.error(f"Error inserting into table '{table}': {str(e)}")
+                    return
+                users = []
         
         logger.info(f"Finish generation of {n} users")
 
-    def _generate_user_profiles(self):
+    def _generate_user_profiles(self, first_id: int, last_id: int):
         table = self.db_name + 'user_profiles'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user_id', first_id, last_id):
+            logger.info(f"Profiles of users {first_id}..{last_id} in table '{table}' already exist, skip")
             return
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users as u")
+        self.cursor.execute(
+            f"SELECT u.user_id FROM untappd_db.users as u WHERE u.user_id BETWEEN %s AND %s ORDER BY u.user_id",
+            (first_id, last_id)
+        )
         ids = list(map(lambda x: x[0], self.cursor.fetchall()))
 
         logger.info(f"Found {len(ids)} ids of users start generating their profiles")
@@ -166,22 +708,16 @@ class Generator():
         profiles = []
 
         for i in range(len(ids)):
-            user_image_url = fake.image_url()
-            sex = random.choice(['male', 'male', 'male', 'female', 'female', 'female', 'not_applicable'])
-            first_name = fake.first_name_male() if sex == 'male' else fake.first_name_female()
-            last_name = fake.last_name_male() if sex == 'male' else fake.last_name_female()
-            date_of_birth = fake.date_of_birth(minimum_age=18, maximum_age=80)
-            profile_desc = fake.text(max_nb_chars=512)
+            profiles.append(self._user_profile_row(ids[i]))
 
-            profiles.append((ids[i], user_image_url, first_name, last_name, sex, date_of_birth, profile_desc))
-
-        try:
-            query = "INSERT INTO untappd_db.user_profiles (user_id, user_image_url, first_name, last_name, sex, date_of_birth, profile_desc) VALUES (%s, %s, %s, %s, %s, %s, %s)"
-            self.cursor.executemany(query, profiles)
-            self.connection.commit()
-        except Exception as e:
-            logger.error(f"Error inserting into table '{table}': {str(e)}")
-            return
+            if len(profiles) > self.batch_size or i + 1 == len(ids):
+                try:
+                    self.cursor.executemany(self.insert_queries['user_profiles'], profiles)
+                    self.connection.commit()
+                except Exception as e:
+                    logger.error(f"Error inserting into table '{table}': {str(e)}")
+                    return
+                profiles = []
         
         logger.info(f"Finish generation of {len(ids)} user profiles")
 
@@ -212,13 +748,16 @@ class Generator():
         
         logger.info(f"Finish generation of {len(roles)} roles")
 
-    def _generate_user_roles(self):
+    def _generate_user_roles(self, first_id: int, last_id: int):
         table = self.db_name + 'user_roles'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user_id', first_id, last_id):
+            logger.info(f"Roles of users {first_id}..{last_id} in table '{table}' already exist, skip")
             return
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users as u")
+        self.cursor.execute(
+            f"SELECT u.user_id FROM untappd_db.users as u WHERE u.user_id BETWEEN %s AND %s ORDER BY u.user_id",
+            (first_id, last_id)
+        )
         ids = list(map(lambda x: x[0], self.cursor.fetchall()))
 
         logger.info(f"Found {len(ids)} ids of users start generating their roles")
@@ -334,13 +873,16 @@ class Generator():
         
         logger.info(f"Finish generation of {n} achievements")
 
-    def _generate_user_achievements(self, n: int):
+    def _generate_user_achievements(self, first_id: int, last_id: int):
         table = self.db_name + 'users_achievements'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user_id', first_id, last_id):
+            logger.info(f"Achievements of users {first_id}..{last_id} in table '{table}' already exist, skip")
             return
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users as u")
+        self.cursor.execute(
+            f"SELECT u.user_id FROM untappd_db.users as u WHERE u.user_id BETWEEN %s AND %s ORDER BY u.user_id",
+            (first_id, last_id)
+        )
         ids = list(map(lambda x: x[0], self.cursor.fetchall()))
 
         self.cursor.execute(f"SELECT a.achievement_id FROM untappd_db.achievements as a")
@@ -367,43 +909,42 @@ class Generator():
         
         logger.info(f"Finish generation of {count} achievements for users")
 
-    def _generate_user_friendships(self):
+    def _generate_user_friendships(self, first_id: int, last_id: int):
         table = self.db_name + 'friendships'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user1_id', first_id, last_id):
+            logger.info(f"Friendships of users {first_id}..{last_id} in table '{table}' already exist, skip")
             return
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users as u")
+        self.cursor.execute(
+            f"SELECT u.user_id FROM untappd_db.users as u WHERE u.user_id BETWEEN %s AND %s ORDER BY u.user_id",
+            (first_id, last_id)
+        )
         ids = list(map(lambda x: x[0], self.cursor.fetchall()))
 
+        # friends are picked among all users with greater ids, including other nodes' ones
+        self.cursor.execute(f"SELECT MAX(u.user_id) FROM untappd_db.users as u")
+        max_user_id = self.cursor.fetchone()[0]
+
         logger.info(f"Found {len(ids)} ids of users start generating friendships")
         
         global_count = 0
         count = 0
         friendships = []
         for i in range(len(ids)):
-            if i == len(ids)-1:
-                try:
-                    query = "INSERT INTO untappd_db.friendships (user1_id, user2_id, status) VALUES (%s, %s, %s)"
-                    self.cursor.executemany(query, friendships)
-                    self.connection.commit()
-                except Exception as e:
-                    logger.error(f"Error inserting into table '{table}': {str(e)}")
-                    return
-                continue
-            friend_ids = set([random.randint(ids[i+1], ids[len(ids)-1]) for k in range(int((random.gauss(10, 4)**2)**0.5))])
+            if ids[i] < max_user_id:
+                friend_ids = set([random.randint(ids[i] + 1, max_user_id) for k in range(int((random.gauss(10, 4)**2)**0.5))])
+            else:
+                friend_ids = set()
             
             for id in friend_ids:
                 count += 1
                 global_count += 1
-                status = random.choice(['active' for k in range(8)] + ['canceled'])
-                friendships.append((ids[i], id, status))
+                friendships.append(self._friendship_row(ids[i], id))
             
             if count > self.batch_size or i + 1 == len(ids):
                 logger.info(f"inserted {global_count}")
                 try:
-                    query = "INSERT INTO untappd_db.friendships (user1_id, user2_id, status) VALUES (%s, %s, %s)"
-                    self.cursor.executemany(query, friendships)
+                    self.cursor.executemany(self.insert_queries['friendships'], friendships)
                     self.connection.commit()
                 except Exception as e:
                     logger.error(f"Error inserting into table '{table}': {str(e)}")
@@ -488,12 +1029,13 @@ class Generator():
         logger.info(f"Finish generation of {n} breweries")
     
 
-    def _generate_beer(self, n: int):
+    def _generate_beer(self, first_id: int, last_id: int):
         table = self.db_name + 'beer'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'beer_id', first_id, last_id):
+            logger.info(f"Beer {first_id}..{last_id} of table '{table}' already exist, skip")
             return
 
+        n = last_id - first_id + 1
         logger.info(f"Start generation of {n} beer")
 
         self.cursor.execute(f"SELECT b.brewery_id FROM untappd_db.brewery AS b")
@@ -505,7 +1047,7 @@ class Generator():
         beer = []
         count = 0
 
-        for _ in range(n):
+        for beer_id in range(first_id, last_id + 1):
             count += 1
             beer_name = fake.word().capitalize() + " " + fake.word()
             beer_desc = fake.text(max_nb_chars=100)
@@ -514,11 +1056,11 @@ class Generator():
             style_id = random.choice(styles)
             abv = round(random.uniform(3.0, 12.0), 2)
             ibu = random.randint(5, 120)
-            beer.append((beer_name, beer_desc, beer_image_url, brewery_id, style_id, abv, ibu))
+            beer.append((beer_id, beer_name, beer_desc, beer_image_url, brewery_id, style_id, abv, ibu))
 
-            if count > self.batch_size or _ + 1== n:
+            if count > self.batch_size or beer_id == last_id:
                 try:
-                    query = "INSERT INTO untappd_db.beer (beer_name, beer_desc, beer_image_url, brewery_id, style_id, abv, ibu) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+                    query = "INSERT INTO untappd_db.beer (beer_id, beer_name, beer_desc, beer_image_url, brewery_id, style_id, abv, ibu) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
                     self.cursor.executemany(query, beer)
                     self.connection.commit()
                 except Exception as e:
@@ -590,33 +1132,34 @@ class Generator():
 
     def _generate_event_users(self):
         table = self.db_name + 'event_users'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+
+        self.cursor.execute(f"SELECT e.event_id FROM untappd_db.events AS e ORDER BY e.event_id")
+        events = self._shard_slice(list(map(lambda x: x[0], self.cursor.fetchall())))
+        if not events:
             return
 
-        logger.info(f"Start generation user events")
+        if not self.is_range_empty(table, 'event_id', events[0], events[len(events)-1]):
+            logger.info(f"Users of events {events[0]}..{events[len(events)-1]} in table '{table}' already exist, skip")
+            return
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users AS u")
-        users = list(map(lambda x: x[0], self.cursor.fetchall()))
+        logger.info(f"Start generation user events")
 
-        self.cursor.execute(f"SELECT e.event_id FROM untappd_db.events AS e")
-        events = list(map(lambda x: x[0], self.cursor.fetchall()))
+        self.cursor.execute(f"SELECT MIN(u.user_id), MAX(u.user_id) FROM untappd_db.users AS u")
+        min_user_id, max_user_id = self.cursor.fetchone()
         count = 0
 
         event_users = []
 
         for event_id in events:
-            user_ids = random.choices(users, k=random.randint(0, 100))
+            user_ids = [random.randint(min_user_id, max_user_id) for k in range(random.randint(0, 100))]
             
             for user_id in user_ids:
                 count += 1
-                status = random.choice(['dislike', 'like', 'willbe'])
-                event_users.append((event_id, user_id, status))
+                event_users.append(self._event_user_row(event_id, user_id))
             
             if count > self.batch_size or event_id == events[len(events)-1]:
                 try:
-                    query = "INSERT INTO untappd_db.event_users (event_id, user_id, status) VALUES (%s, %s, %s)"
-                    self.cursor.executemany(query, event_users)
+                    self.cursor.executemany(self.insert_queries['event_users'], event_users)
                     self.connection.commit()
                 except Exception as e:
                     logger.error(f"Error inserting into table '{table}': {str(e)}")
@@ -627,25 +1170,28 @@ class Generator():
         
         logger.info(f"Finish generation of user events")
     
-    def _generate_place_beer_assortment(self, n: int):
+    def _generate_place_beer_assortment(self):
         table = self.db_name + 'place_beer_assortment'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+
+        self.cursor.execute(f"SELECT p.place_id FROM untappd_db.places AS p ORDER BY p.place_id")
+        place = self._shard_slice(list(map(lambda x: x[0], self.cursor.fetchall())))
+        if not place:
             return
 
-        logger.info(f"Start generation of beer assortment for places")
+        if not self.is_range_empty(table, 'place_id', place[0], place[len(place)-1]):
+            logger.info(f"Assortment of places {place[0]}..{place[len(place)-1]} in table '{table}' already exist, skip")
+            return
 
-        self.cursor.execute(f"SELECT b.beer_id FROM untappd_db.beer AS b")
-        beer = list(map(lambda x: x[0], self.cursor.fetchall()))
+        logger.info(f"Start generation of beer assortment for places")
 
-        self.cursor.execute(f"SELECT p.place_id FROM untappd_db.places AS p")
-        place = list(map(lambda x: x[0], self.cursor.fetchall()))
+        self.cursor.execute(f"SELECT MIN(b.beer_id), MAX(b.beer_id) FROM untappd_db.beer AS b")
+        min_beer_id, max_beer_id = self.cursor.fetchone()
         count = 0
 
         beer_assortment = []
 
         for place_id in place:
-            beers = random.choices(beer, k=int(random.gauss(500, 200)))
+            beers = [random.randint(min_beer_id, max_beer_id) for k in range(int(random.gauss(500, 200)))]
             for beer_id in beers:
                 count += 1
                 serving = random.choice(['bottle', 'tap', 'can'])
@@ -665,21 +1211,24 @@ class Generator():
         
         logger.info(f"Finish generation of beer assortment for places")
 
-    def _generate_reviews(self):
+    def _generate_reviews(self, first_id: int, last_id: int):
         table = self.db_name + 'reviews'
-        if not self.is_table_empty(table):
-            logger.info(f"Table '{table}' is not empty, skip")
+        if not self.is_range_empty(table, 'user_id', first_id, last_id):
+            logger.info(f"Reviews of users {first_id}..{last_id} in table '{table}' already exist, skip")
             return
 
         logger.info(f"Start generation of reviews for places")
 
-        self.cursor.execute(f"SELECT b.beer_id FROM untappd_db.beer AS b")
-        beer = list(map(lambda x: x[0], self.cursor.fetchall()))
+        self.cursor.execute(f"SELECT MIN(b.beer_id), MAX(b.beer_id) FROM untappd_db.beer AS b")
+        min_beer_id, max_beer_id = self.cursor.fetchone()
 
         self.cursor.execute(f"SELECT p.place_id FROM untappd_db.places AS p")
         place = list(map(lambda x: x[0], self.cursor.fetchall()))
 
-        self.cursor.execute(f"SELECT u.user_id FROM untappd_db.users AS u")
+        self.cursor.execute(
+            f"SELECT u.user_id FROM untappd_db.users AS u WHERE u.user_id BETWEEN %s AND %s ORDER BY u.user_id",
+            (first_id, last_id)
+        )
         user = list(map(lambda x: x[0], self.cursor.fetchall()))
 
         self.cursor.execute(f"SELECT e.event_id FROM untappd_db.events AS e")
@@ -689,24 +1238,14 @@ class Generator():
         reviews = []
 
         for user_id in user:   
-            beers = list(set([random.randint(beer[0], beer[len(beer)-1]) for i in range(random.randint(0, 10))]))
+            beers = list(set([random.randint(min_beer_id, max_beer_id) for i in range(random.randint(0, 10))]))
             for beer_id in beers:
                 count += 1
-                rating = round(random.uniform(0.0, 5.0), 1)
-                serving = random.choice(['bottle', 'tap', 'can', None])
-                place_id = random.choice(place)
-                comment = fake.sentence(nb_words=15, variable_nb_words=True, ext_word_list=None)
-                photo_url = fake.image_url()
-                event_id = None
-                if random.randint(0,1):
-                    event_id = random.choice(event)
-                serving = random.choice(['bottle', 'tap', 'can'])
-                reviews.append((user_id, beer_id, rating, serving, place_id, comment, photo_url, event_id))
+                reviews.append(self._review_row(user_id, beer_id, place, event))
             
             if count > self.batch_size or user_id == user[len(user)-1]:
                 try:
-                    query = "INSERT INTO untappd_db.reviews (user_id, beer_id, rating, serving, place_id, comment, photo_url, event_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-                    self.cursor.executemany(query, reviews)
+                    self.cursor.executemany(self.insert_queries['reviews'], reviews)
                     self.connection.commit()
                 except Exception as e:
                     logger.error(f"Error inserting into table '{table}': {str(e)}")
@@ -718,6 +1257,7 @@ class Generator():
 
         
 
+
 def main():
     rand_seed = int(os.environ.get("RANDOM_SEED"))
     n = int(os.environ.get("USERS_NUM"))
@@ -729,17 +1269,44 @@ def main():
     port = int(os.environ.get("POSTGRES_PORT"))
     connect_retries = int(os.environ.get("POSTGRES_CONNECT_RETRIES"))
     connect_interval = int(os.environ.get("POSTGRES_CONNECT_INTERVAL"))
+    node_index = int(os.environ.get("NODE_INDEX", 0))
+    node_count = int(os.environ.get("NODE_COUNT", 1))
+    node_wait_timeout = int(os.environ.get("NODE_WAIT_TIMEOUT", 3600))
 
     generator = Generator(
         dbname, user, pwd, host, port,
         connect_retries, connect_interval,
-        crypt_key, rand_seed
+        crypt_key, rand_seed,
+        node_index, node_count, node_wait_timeout
     )
 
-    if os.environ.get("GENERATE_WITH_CLEANING") == "true":
+    # `python init.py validate` checks already generated data instead of generating it
+    if len(sys.argv) > 1 and sys.argv[1] == "validate":
+        failures = generator.validate_data(n, float(os.environ.get("VALIDATE_SAMPLE_PERCENT", 1)))
+        generator.close_connection()
+        sys.exit(1 if failures else 0)
+
+    # only the first node may truncate, the others would wipe each other's shards
+    if os.environ.get("GENERATE_WITH_CLEANING") == "true" and node_index == 0:
         generator.clean_tables()
 
     generator.init_data(n)
+
+    # tables are shared, so the stage runs once, on the first node
+    if os.environ.get("OPTIMIZE_AFTER_GENERATION") == "true" and node_index == 0:
+        generator.optimize_data(
+            int(os.environ.get("OPTIMIZE_WORKERS", 4)),
+            os.environ.get("OPTIMIZE_CLUSTER") == "true"
+        )
+
+    trickle_rate = int(os.environ.get("TRICKLE_ROWS_PER_SEC", 0))
+    if trickle_rate > 0:
+        generator.trickle_data(
+            n,
+            trickle_rate,
+            int(os.environ.get("TRICKLE_DURATION", 0)),
+            int(os.environ.get("TRICKLE_BATCH_SIZE", 50))
+        )
     generator.close_connection()
 
 